@@ -0,0 +1,53 @@
+"""add scrape_jobs table
+
+Revision ID: 9b1e4c7d2a10
+Revises: f3cd2b078a00
+Create Date: 2026-10-19 10:12:41.218305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b1e4c7d2a10'
+down_revision: Union[str, Sequence[str], None] = 'f3cd2b078a00'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('scrape_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('category', sa.String(), nullable=False),
+    sa.Column('query', sa.String(), server_default='', nullable=False),
+    sa.Column('limit', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), server_default='queued', nullable=False),
+    sa.Column('stage', sa.String(), nullable=True),
+    sa.Column('progress', sa.Float(), server_default='0', nullable=False),
+    sa.Column('changed', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_scrape_jobs_id'), 'scrape_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_scrape_jobs_status'), 'scrape_jobs', ['status'], unique=False)
+    op.create_index(
+        'ux_scrape_jobs_active_category', 'scrape_jobs', ['category'], unique=True,
+        postgresql_where=sa.text("status IN ('queued', 'running')"),
+        sqlite_where=sa.text("status IN ('queued', 'running')"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ux_scrape_jobs_active_category', table_name='scrape_jobs')
+    op.drop_index(op.f('ix_scrape_jobs_status'), table_name='scrape_jobs')
+    op.drop_index(op.f('ix_scrape_jobs_id'), table_name='scrape_jobs')
+    op.drop_table('scrape_jobs')
@@ -0,0 +1,38 @@
+"""add crawl_targets table
+
+Revision ID: c42d8e5f1b37
+Revises: 9b1e4c7d2a10
+Create Date: 2026-10-19 14:03:27.904112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c42d8e5f1b37'
+down_revision: Union[str, Sequence[str], None] = '9b1e4c7d2a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('crawl_targets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('category', sa.String(), nullable=False),
+    sa.Column('query', sa.String(), server_default='', nullable=False),
+    sa.Column('last_crawled_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('last_new_count', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('category', 'query', name='uq_crawl_targets_category_query')
+    )
+    op.create_index(op.f('ix_crawl_targets_id'), 'crawl_targets', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_crawl_targets_id'), table_name='crawl_targets')
+    op.drop_table('crawl_targets')
@@ -0,0 +1,34 @@
+"""add job heartbeat and index_state
+
+Revision ID: e7a3f90b6c21
+Revises: c42d8e5f1b37
+Create Date: 2026-10-19 18:41:05.537920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3f90b6c21'
+down_revision: Union[str, Sequence[str], None] = 'c42d8e5f1b37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('scrape_jobs', sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_table('index_state',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('generation', sa.BigInteger(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('index_state')
+    op.drop_column('scrape_jobs', 'heartbeat_at')
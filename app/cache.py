@@ -0,0 +1,191 @@
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+
+CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL_SECONDS = int(os.getenv("SEARCH_CACHE_TTL", "3600"))
+REDIS_URL = os.getenv("SEARCH_CACHE_REDIS_URL")
+KEY_PREFIX = "search_cache:"
+GENERATION_KEY = KEY_PREFIX + "generation"
+# по скольким ключам оцениваем средний размер записи в Redis
+STATS_SAMPLE_SIZE = 100
+
+
+def normalize_query(q: str | None, fold_case: bool = True) -> str:
+    if not q:
+        return ""
+    if fold_case:
+        q = q.lower()
+    return " ".join(q.split())
+
+
+def make_key(endpoint: str, generation: int | str, q: str | None, limit: int, fold_case: bool = True, **filters) -> str:
+    parts = {
+        "endpoint": endpoint,
+        "generation": generation,
+        "q": normalize_query(q, fold_case),
+        "limit": limit,
+        "filters": {k: v for k, v in sorted(filters.items()) if v is not None},
+    }
+    return KEY_PREFIX + json.dumps(parts, ensure_ascii=False, sort_keys=True)
+
+
+class LRUBackend:
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, str] = OrderedDict()
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_generation(self) -> int:
+        return self.generation
+
+    def stats(self) -> dict:
+        with self.lock:
+            memory = sys.getsizeof(self.entries) + sum(
+                sys.getsizeof(k) + sys.getsizeof(v) for k, v in self.entries.items()
+            )
+            return {
+                "backend": "lru",
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "memory_bytes": memory,
+            }
+
+
+class RedisBackend:
+    """Кэш необязателен: ошибки Redis не должны ронять поиск, поэтому они глушатся."""
+
+    def __init__(self, url: str, ttl: int = CACHE_TTL_SECONDS):
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key: str) -> str | None:
+        try:
+            value = self.client.get(key)
+        except redis.RedisError:
+            return None
+        if value is None:
+            return None
+        return value.decode("utf-8")
+
+    def set(self, key: str, value: str):
+        try:
+            self.client.set(key, value, ex=self.ttl)
+        except redis.RedisError:
+            pass
+
+    def get_generation(self) -> int | None:
+        # объявления инвалидирует index_state в базе; этот ключ нужен, чтобы
+        # сбросить кэш вручную (INCR), а None — Redis недоступен, кэш не трогаем
+        try:
+            value = self.client.get(GENERATION_KEY)
+        except redis.RedisError:
+            return None
+        return int(value) if value else 0
+
+    def stats(self) -> dict:
+        try:
+            # в той же базе Redis могут быть чужие ключи, считаем только свои
+            keys = [
+                k for k in self.client.scan_iter(match=KEY_PREFIX + "*", count=1000)
+                if k.decode("utf-8") != GENERATION_KEY
+            ]
+            # память оцениваем по выборке одним pipeline, а не MEMORY USAGE на каждый ключ
+            sample = keys[:STATS_SAMPLE_SIZE]
+            pipe = self.client.pipeline(transaction=False)
+            for k in sample:
+                pipe.memory_usage(k)
+            sizes = [size or 0 for size in pipe.execute()]
+        except redis.RedisError as e:
+            return {"backend": "redis", "error": str(e)}
+
+        avg_size = sum(sizes) / len(sizes) if sizes else 0
+        return {
+            "backend": "redis",
+            "entries": len(keys),
+            "ttl_seconds": self.ttl,
+            "memory_bytes_estimate": int(avg_size * len(keys)),
+        }
+
+
+class SearchCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_or_compute(
+        self,
+        endpoint: str,
+        compute,
+        q: str | None,
+        limit: int,
+        index_generation: int = 0,
+        fold_case: bool = True,
+        **filters
+    ):
+        backend_generation = self.backend.get_generation()
+        if backend_generation is None:
+            with self.lock:
+                self.misses += 1
+            return compute()
+
+        # index_generation приходит из базы: воркер обновляет объявления в другом процессе
+        generation = f"{backend_generation}:{index_generation}"
+        key = make_key(endpoint, generation, q, limit, fold_case, **filters)
+        cached = self.backend.get(key)
+        if cached is not None:
+            with self.lock:
+                self.hits += 1
+            return json.loads(cached)
+
+        with self.lock:
+            self.misses += 1
+        result = compute()
+        self.backend.set(key, json.dumps(result, ensure_ascii=False))
+        return result
+
+    def stats(self) -> dict:
+        with self.lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            **self.backend.stats(),
+            "generation": self.backend.get_generation(),
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else 0.0,
+        }
+
+
+def make_backend():
+    if REDIS_URL and redis is not None:
+        return RedisBackend(REDIS_URL)
+    return LRUBackend()
+
+
+search_cache = SearchCache(make_backend())
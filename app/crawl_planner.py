@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterable, List
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from . import models
+from .db import SessionLocal
+from .scraper_lalafo import LalafoAd, scrape_lalafo
+
+# сколько известных объявлений подряд считаем признаком того, что новые кончились;
+# сверху выдачи бывают закреплённые VIP-объявления, поэтому не 1
+STOP_AFTER_KNOWN = 10
+
+# цель, которая в прошлый раз не дала новых объявлений, обходим во столько раз реже
+IDLE_TARGET_BACKOFF = 4
+
+
+def known_urls(db: Session, urls: list[str]) -> set[str]:
+    """Seen-set по уникальному индексу ix_ads_url."""
+    if not urls:
+        return set()
+    rows = db.query(models.Ad.url).filter(models.Ad.url.in_(urls)).all()
+    return {url for (url,) in rows}
+
+
+def get_or_create_target(db: Session, category: str, query: str) -> models.CrawlTarget:
+    target = (
+        db.query(models.CrawlTarget)
+        .filter(models.CrawlTarget.category == category, models.CrawlTarget.query == query)
+        .first()
+    )
+    if target:
+        return target
+
+    target = models.CrawlTarget(category=category, query=query)
+    db.add(target)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        return get_or_create_target(db, category, query)
+    db.refresh(target)
+    return target
+
+
+def plan_crawl(db: Session, pairs: Iterable[tuple[str, str]]) -> List[models.CrawlTarget]:
+    """Цели для пар (категория, запрос); сначала ни разу не обойдённые, потом самые давние."""
+    targets = [get_or_create_target(db, c, q) for c, q in dict.fromkeys(pairs)]
+    targets.sort(key=lambda t: (t.last_crawled_at is not None, t.last_crawled_at or 0))
+    return targets
+
+
+def due_targets(db: Session, pairs: Iterable[tuple[str, str]], every: timedelta) -> List[models.CrawlTarget]:
+    """Цели, которые пора обходить; пустые в прошлый раз ждут в IDLE_TARGET_BACKOFF раз дольше."""
+    now = datetime.now(timezone.utc)
+
+    def is_due(t: models.CrawlTarget) -> bool:
+        if t.last_crawled_at is None:
+            return True
+        interval = every if t.last_new_count else every * IDLE_TARGET_BACKOFF
+        return t.last_crawled_at < now - interval
+
+    due = [t for t in plan_crawl(db, pairs) if is_due(t)]
+    # новые цели первыми, затем те, что приносят больше новых объявлений
+    due.sort(key=lambda t: (t.last_crawled_at is not None, -t.last_new_count))
+    return due
+
+
+def crawl_target(
+    db: Session,
+    target: models.CrawlTarget,
+    max_items: int,
+    on_progress: Callable[[int], None] | None = None,
+) -> List[LalafoAd]:
+    """
+    Инкрементальный обход одной цели: выдача по новизне, обход останавливается
+    на первой плотной полосе уже известных объявлений. Известные из последних
+    раундов тоже возвращаются, чтобы ingest обновил их и дозаполнил эмбеддинги.
+    """
+    # время попытки, а не успеха: иначе падающая цель ставилась бы в очередь на каждом тике
+    target.last_crawled_at = func.now()
+    db.commit()
+
+    known: set[str] = set()
+
+    def is_known(urls: list[str]) -> set[str]:
+        # отдельная короткая сессия: основная не должна висеть в транзакции, пока листаем страницу
+        lookup_db = SessionLocal()
+        try:
+            found = known_urls(lookup_db, urls)
+        finally:
+            lookup_db.close()
+        known.update(found)
+        return found
+
+    ads = scrape_lalafo(
+        target.query,
+        max_items=max_items,
+        category=target.category,
+        on_progress=on_progress,
+        newest_first=True,
+        is_known=is_known,
+        stop_after_known=STOP_AFTER_KNOWN,
+    )
+
+    target.last_new_count = sum(1 for ad in ads if ad.url not in known)
+    db.commit()
+    return ads
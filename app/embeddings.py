@@ -45,6 +45,12 @@ def embed_text(text: str) -> list[float]:
     vec = model.encode(text)
     return vec.astype(float).tolist()
 
+def embed_texts(texts: list[str]) -> list[list[float]]:
+    if not texts:
+        return []
+    vecs = model.encode(texts)
+    return [vec.astype(float).tolist() for vec in vecs]
+
 def cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
     denom = float(np.linalg.norm(a)) * float(np.linalg.norm(b))
     if denom == 0.0:
@@ -0,0 +1,175 @@
+import json
+from typing import Callable, List
+from sqlalchemy import and_, bindparam, literal_column, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from . import models
+from .embeddings import build_ad_text, embed_texts
+from .scraper_lalafo import LalafoAd
+
+CHUNK_SIZE = 500
+
+CONTENT_COLUMNS = ("title", "description", "price", "city")
+INDEX_STATE_ID = 1
+
+
+def bump_index_generation(db: Session):
+    """Вызывать в той же транзакции, что пишет в ads."""
+    state_table = models.IndexState.__table__
+    stmt = insert(state_table).values(id=INDEX_STATE_ID, generation=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[state_table.c.id],
+        set_={"generation": state_table.c.generation + 1},
+    )
+    db.execute(stmt)
+
+
+def index_generation(db: Session) -> int:
+    state = db.get(models.IndexState, INDEX_STATE_ID)
+    return state.generation if state else 0
+
+
+def write_embeddings(db: Session, rows: list[dict]) -> int:
+    """
+    Считает и записывает эмбеддинги для строк (id + содержимое) короткой отдельной
+    транзакцией. Строки с пустым текстом пропускаются. Возвращает число посчитанных.
+    """
+    texts = [build_ad_text(models.Ad(**{col: row[col] for col in CONTENT_COLUMNS})) for row in rows]
+    rows, texts = [row for row, t in zip(rows, texts) if t.strip()], [t for t in texts if t.strip()]
+    vecs = embed_texts(texts)
+    if not vecs:
+        return 0
+
+    # пока считали эмбеддинги, параллельный обход мог поменять объявление;
+    # тогда строка не совпадёт по содержимому и её эмбеддинг посчитает он
+    ad_table = models.Ad.__table__
+    stmt = (
+        update(ad_table)
+        .where(and_(
+            ad_table.c.id == bindparam("ad_id"),
+            *[ad_table.c[col].is_not_distinct_from(bindparam(f"old_{col}")) for col in CONTENT_COLUMNS],
+        ))
+        .values(embedding=bindparam("new_embedding"))
+    )
+    db.execute(stmt, [
+        {
+            "ad_id": row["id"],
+            "new_embedding": json.dumps(vec),
+            **{f"old_{col}": row[col] for col in CONTENT_COLUMNS},
+        }
+        for row, vec in zip(rows, vecs)
+    ])
+    bump_index_generation(db)
+    db.commit()
+    return len(vecs)
+
+
+def upsert_chunk(db: Session, rows: list[dict]) -> dict:
+    """
+    Один INSERT ... ON CONFLICT (url) DO UPDATE ... RETURNING на пачку.
+    Существующая строка обновляется, только если поменялось содержимое, поэтому
+    RETURNING отдаёт новые и изменённые объявления — ровно те, кому нужен эмбеддинг.
+
+    Upsert коммитится сразу, эмбеддинги пишутся второй короткой транзакцией:
+    модель не должна работать, пока держим блокировки строк. Старый эмбеддинг
+    изменённой строки остаётся в поиске, пока его не заменит новый. Новые строки,
+    не получившие эмбеддинг из-за сбоя, подбирает backfill_missing_embeddings.
+    """
+    ad_table = models.Ad.__table__
+    stmt = insert(ad_table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[ad_table.c.url],
+        set_={col: stmt.excluded[col] for col in CONTENT_COLUMNS},
+        where=or_(
+            *[ad_table.c[col].is_distinct_from(stmt.excluded[col]) for col in CONTENT_COLUMNS],
+        ),
+    ).returning(
+        ad_table.c.id,
+        ad_table.c.url,
+        # xmax = 0 только у только что вставленных строк
+        literal_column("(xmax = 0)").label("inserted"),
+    )
+    returned = db.execute(stmt).all()
+    if returned:
+        bump_index_generation(db)
+    db.commit()
+
+    by_url = {row["url"]: row for row in rows}
+    embedded = write_embeddings(db, [{"id": r.id, **by_url[r.url]} for r in returned])
+
+    inserted = sum(1 for row in returned if row.inserted)
+    return {
+        "inserted": inserted,
+        "updated": len(returned) - inserted,
+        "unchanged": len(rows) - len(returned),
+        "embedded": embedded,
+    }
+
+
+def backfill_missing_embeddings(db: Session, batch_size: int = CHUNK_SIZE, max_rows: int | None = None) -> int:
+    """
+    Дозаполняет embedding IS NULL без повторного скрапинга: инкрементальный обход
+    до старых объявлений может больше не дойти. Идём по id, поэтому строки с пустым
+    текстом просматриваются один раз за проход и не зацикливают его.
+    """
+    last_id = 0
+    seen = 0
+    reembedded = 0
+    while max_rows is None or seen < max_rows:
+        size = batch_size if max_rows is None else min(batch_size, max_rows - seen)
+        ads = (
+            db.query(models.Ad.id, *[getattr(models.Ad, col) for col in CONTENT_COLUMNS])
+            .filter(models.Ad.embedding.is_(None), models.Ad.id > last_id)
+            .order_by(models.Ad.id)
+            .limit(size)
+            .all()
+        )
+        db.commit()
+        if not ads:
+            break
+        last_id = ads[-1].id
+        seen += len(ads)
+        reembedded += write_embeddings(db, [dict(ad._mapping) for ad in ads])
+    return reembedded
+
+
+def summarize_chunks(chunks: list[dict]) -> dict:
+    totals = {
+        key: sum(chunk[key] for chunk in chunks)
+        for key in ("inserted", "updated", "unchanged", "embedded")
+    }
+    return {**totals, "chunks": chunks}
+
+
+def bulk_upsert_ads(
+    db: Session,
+    scraped_ads: List[LalafoAd],
+    chunk_size: int = CHUNK_SIZE,
+    on_progress: Callable[[int, int], None] | None = None,
+    on_chunk: Callable[[dict], None] | None = None,
+) -> dict:
+    """on_chunk вызывается после коммита каждой пачки, даже если следующая потом упадёт."""
+    # внутри одного INSERT ... ON CONFLICT url не может повторяться
+    rows_by_url: dict[str, dict] = {}
+    for s in scraped_ads:
+        if s.url and s.url not in rows_by_url:
+            rows_by_url[s.url] = {
+                "title": s.title,
+                "description": s.description,
+                "price": s.price,
+                "url": s.url,
+                "city": s.city,
+            }
+    # одинаковый порядок блокировок у параллельных обходов, иначе возможен дедлок
+    rows = sorted(rows_by_url.values(), key=lambda row: row["url"])
+
+    chunks = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = upsert_chunk(db, rows[start:start + chunk_size])
+        chunks.append(chunk)
+        if on_chunk:
+            on_chunk(chunk)
+        if on_progress:
+            on_progress(min(start + chunk_size, len(rows)), len(rows))
+
+    return summarize_chunks(chunks)
@@ -0,0 +1,197 @@
+import json
+import traceback
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from . import models
+from .db import SessionLocal
+from .ingest import backfill_missing_embeddings, bulk_upsert_ads, summarize_chunks
+from .crawl_planner import crawl_target, get_or_create_target
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# доля прогресса, отведённая на скрапинг; остальное — запись в базу
+SCRAPE_SHARE = 0.7
+
+HEARTBEAT_INTERVAL = timedelta(seconds=30)
+# задача без heartbeat дольше этого считается брошенной упавшим воркером
+STALE_JOB_TIMEOUT = timedelta(minutes=10)
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def job_to_dict(job: models.ScrapeJob) -> dict:
+    return {
+        "id": job.id,
+        "category": job.category,
+        "query": job.query,
+        "limit": job.limit,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": job.progress,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "heartbeat_at": job.heartbeat_at,
+        "finished_at": job.finished_at,
+    }
+
+
+def find_active_job(db: Session, category: str) -> models.ScrapeJob | None:
+    return (
+        db.query(models.ScrapeJob)
+        .filter(
+            models.ScrapeJob.category == category,
+            models.ScrapeJob.status.in_(ACTIVE_STATUSES),
+        )
+        .first()
+    )
+
+
+def enqueue_refresh(db: Session, category: str, query: str, limit: int) -> tuple[models.ScrapeJob, bool]:
+    """
+    Возвращает (задача, создана ли новая). Если категория уже в работе — отдаём
+    существующую, её query может отличаться от запрошенного.
+    """
+    while True:
+        active = find_active_job(db, category)
+        if active:
+            return active, False
+
+        job = models.ScrapeJob(category=category, query=query, limit=limit, status="queued")
+        db.add(job)
+        try:
+            db.commit()
+        except IntegrityError:
+            # параллельный запрос успел поставить задачу раньше нас; если она уже
+            # завершилась, на следующем круге просто вставим свою
+            db.rollback()
+            continue
+        db.refresh(job)
+        return job, True
+
+
+def expire_stale_jobs(db: Session) -> int:
+    cutoff = utcnow() - STALE_JOB_TIMEOUT
+    stale = (
+        db.query(models.ScrapeJob)
+        .filter(
+            models.ScrapeJob.status == "running",
+            func.coalesce(models.ScrapeJob.heartbeat_at, models.ScrapeJob.started_at) < cutoff,
+        )
+        .all()
+    )
+    for job in stale:
+        job.status = "failed"
+        job.error = "worker stopped sending heartbeats"
+        job.finished_at = func.now()
+    db.commit()
+    return len(stale)
+
+
+def claim_next_job(db: Session) -> models.ScrapeJob | None:
+    expire_stale_jobs(db)
+
+    query = (
+        db.query(models.ScrapeJob)
+        .filter(models.ScrapeJob.status == "queued")
+        .order_by(models.ScrapeJob.id)
+    )
+    if db.bind.dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+
+    job = query.first()
+    if not job:
+        db.commit()
+        return None
+
+    job.status = "running"
+    job.stage = "scraping"
+    job.started_at = func.now()
+    job.heartbeat_at = utcnow()
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+class JobLost(Exception):
+    """Задачу уже пометили failed как брошенную (expire_stale_jobs), выполнять её дальше нельзя."""
+
+
+def update_running_job(job_db: Session, job_id: int, **values):
+    # условный UPDATE: если задачу успели пометить брошенной, не перетираем её статус
+    matched = (
+        job_db.query(models.ScrapeJob)
+        .filter(models.ScrapeJob.id == job_id, models.ScrapeJob.status == "running")
+        .update(values, synchronize_session=False)
+    )
+    job_db.commit()
+    if not matched:
+        raise JobLost(job_id)
+
+
+def run_job(job_db: Session, job: models.ScrapeJob):
+    job_id = job.id
+    state = {"stage": job.stage, "progress": 0.0, "heartbeat_at": job.heartbeat_at}
+
+    def set_progress(stage: str, value: float):
+        value = round(min(value, 1.0), 2)
+        now = utcnow()
+        heartbeat_due = state["heartbeat_at"] is None or now - state["heartbeat_at"] >= HEARTBEAT_INTERVAL
+        if state["stage"] == stage and value - state["progress"] < 0.05 and not heartbeat_due:
+            return
+        update_running_job(job_db, job_id, stage=stage, progress=value, heartbeat_at=now)
+        state.update(stage=stage, progress=value, heartbeat_at=now)
+
+    committed_chunks: list[dict] = []
+    db = SessionLocal()
+    try:
+        target = get_or_create_target(db, job.category, job.query)
+        scraped_ads = crawl_target(
+            db,
+            target,
+            max_items=job.limit,
+            on_progress=lambda n: set_progress("scraping", SCRAPE_SHARE * n / job.limit),
+        )
+        set_progress("ingesting", SCRAPE_SHARE)
+        result = bulk_upsert_ads(
+            db,
+            scraped_ads[:job.limit],
+            on_progress=lambda i, total: set_progress(
+                "ingesting", SCRAPE_SHARE + (1.0 - SCRAPE_SHARE) * i / total
+            ),
+            on_chunk=committed_chunks.append,
+        )
+        result["scraped"] = len(scraped_ads)
+        # эмбеддинги, потерянные прошлыми сбоями, отдельно от изменений содержимого
+        result["reembedded"] = backfill_missing_embeddings(db, max_rows=job.limit)
+
+        final = {
+            "status": "done",
+            "stage": None,
+            "progress": 1.0,
+            "changed": result["inserted"] + result["updated"] + result["reembedded"],
+            "result": json.dumps(result),
+        }
+    except JobLost:
+        db.rollback()
+        return
+    except Exception:
+        db.rollback()
+        final = {"status": "failed", "error": traceback.format_exc()}
+        if committed_chunks:
+            # пачки коммитятся по отдельности: сохраняем то, что успело записаться
+            result = summarize_chunks(committed_chunks)
+            final["changed"] = result["inserted"] + result["updated"]
+            final["result"] = json.dumps(result)
+    finally:
+        db.close()
+
+    try:
+        update_running_job(job_db, job_id, finished_at=func.now(), **final)
+    except JobLost:
+        pass
@@ -1,13 +1,16 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, HTTPException
 from sqlalchemy.orm import Session
 from .db import get_db, init_db
 from . import models
 from pydantic import BaseModel
-from .scraper_lalafo import scrape_lalafo
+from .scraper_lalafo import DEFAULT_CATEGORY
 from sqlalchemy import or_
 import json
 import numpy as np
-from .embeddings import build_ad_text, embed_text, cosine_sim, detect_price_intent
+from .embeddings import embed_text, cosine_sim, detect_price_intent
+from .jobs import enqueue_refresh, job_to_dict
+from .ingest import index_generation
+from .cache import search_cache
 from fastapi.middleware.cors import CORSMiddleware
 
 
@@ -24,6 +27,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+LOCAL_SEARCH_LIMIT = 50
+
+
 class AdCreate(BaseModel):
     title: str
     description: str | None = None
@@ -45,7 +51,15 @@ def list_ads(db: Session = Depends(get_db)):
 
 @app.get("/ads/semantic_search")
 def semantic_search(q: str, limit: int = 10, db: Session = Depends(get_db)):
-    return run_semantic_search(q=q, limit=limit, db=db)
+    return search_cache.get_or_compute(
+        "semantic_search",
+        lambda: run_semantic_search(q=q, limit=limit, db=db),
+        q=q,
+        limit=limit,
+        index_generation=index_generation(db),
+        # модель различает регистр, поэтому для семантики только схлопываем пробелы
+        fold_case=False,
+    )
 
 
 
@@ -58,6 +72,31 @@ def local_search(
     min_price: float | None = None,
     max_price: float | None = None,
     db: Session = Depends(get_db)
+):
+    return search_cache.get_or_compute(
+        "local_search",
+        lambda: run_local_search(q, city, min_price, max_price, LOCAL_SEARCH_LIMIT, db),
+        q=q,
+        limit=LOCAL_SEARCH_LIMIT,
+        index_generation=index_generation(db),
+        city=city,
+        min_price=min_price,
+        max_price=max_price,
+    )
+
+
+@app.get("/ads/search_cache/stats")
+def search_cache_stats():
+    return search_cache.stats()
+
+
+def run_local_search(
+    q: str | None,
+    city: str | None,
+    min_price: float | None,
+    max_price: float | None,
+    limit: int,
+    db: Session
 ):
     query = db.query(models.Ad)
 
@@ -82,7 +121,7 @@ def local_search(
     
     query = query.order_by(models.Ad.id.desc())
 
-    ads = query.limit(50).all()
+    ads = query.limit(limit).all()
 
     return [
         {
@@ -100,56 +139,32 @@ def local_search(
 
 
 @app.post("/ads/refresh_lalafo")
-def refresh_lalafo(limit: int = 500, db: Session = Depends(get_db)):
-    scraped_ads = scrape_lalafo("", max_items=limit)
-    urls = [ad.url for ad in scraped_ads if ad.url]
-    existing_ads = []
-    if urls:
-        existing_ads = (
-            db.query(models.Ad).filter(models.Ad.url.in_(urls)).all()
-        )
-    
-    existing_by_url = {ad.url: ad for ad in existing_ads}
-    new_urls = set()
-    created = 0
-    updated_emb = 0
-    for s in scraped_ads[:limit]:
-        if not s.url:
-            continue
-        existing = existing_by_url.get(s.url)
-        if existing:
-            if not existing.embedding:
-                text = build_ad_text(existing)
-                if text.strip():
-                    vec = embed_text(text)
-                    existing.embedding = json.dumps(vec)
-                    updated_emb += 1
-            continue 
-
-        if s.url in new_urls:
-            continue 
-
-        ad = models.Ad(
-            title=s.title,
-            description=s.description,
-            price=s.price,
-            url=s.url,
-            city=s.city
-        )
-        text = build_ad_text(ad)
-        if text.strip():
-            vec = embed_text(text)
-            ad.embedding = json.dumps(vec)
-        db.add(ad)
-        created += 1
-        new_urls.add(s.url)
-    db.commit()
+def refresh_lalafo(
+    limit: int = 500,
+    category: str = DEFAULT_CATEGORY,
+    q: str = "",
+    db: Session = Depends(get_db)
+):
+    job, created = enqueue_refresh(db, category, q, limit)
+    # одновременно по категории идёт только одно обновление, и оно может быть с другим запросом
     return {
-        "created": created,
-        "updated_embeddings": updated_emb
+        "job_id": job.id,
+        "status": job.status,
+        "category": job.category,
+        "query": job.query,
+        "already_running": not created,
+        "query_matches": job.query == q
     }
 
 
+@app.get("/ads/refresh_lalafo/{job_id}")
+def refresh_status(job_id: int, db: Session = Depends(get_db)):
+    job = db.get(models.ScrapeJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job_to_dict(job)
+
+
 def run_semantic_search(q: str, limit: int, db: Session):
     query_vec = np.array(embed_text(q), dtype=float)
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Text, Index, UniqueConstraint, text
 from sqlalchemy.sql import func 
 from app.db import Base
 
@@ -12,4 +12,56 @@ class Ad(Base):
     url = Column(String, unique=True, index=True)
     city = Column(String, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    embedding = Column(Text, nullable=True)
\ No newline at end of file
+    embedding = Column(Text, nullable=True)
+
+
+class ScrapeJob(Base):
+    __tablename__ = "scrape_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    category = Column(String, nullable=False)
+    query = Column(String, nullable=False, server_default="")
+    limit = Column(Integer, nullable=False)
+    status = Column(String, nullable=False, server_default="queued", index=True)
+    stage = Column(String, nullable=True)
+    progress = Column(Float, nullable=False, server_default="0")
+    changed = Column(Integer, nullable=False, server_default="0")
+    result = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    # не больше одного активного обновления на категорию
+    __table_args__ = (
+        Index(
+            "ux_scrape_jobs_active_category",
+            "category",
+            unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+            sqlite_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+
+class IndexState(Base):
+    """Одна строка с монотонным счётчиком изменений ads, по нему сбрасывается кэш поиска."""
+    __tablename__ = "index_state"
+
+    id = Column(Integer, primary_key=True)
+    generation = Column(BigInteger, nullable=False, server_default="0")
+
+
+class CrawlTarget(Base):
+    __tablename__ = "crawl_targets"
+
+    id = Column(Integer, primary_key=True, index=True)
+    category = Column(String, nullable=False)
+    query = Column(String, nullable=False, server_default="")
+    last_crawled_at = Column(DateTime(timezone=True), nullable=True)
+    last_new_count = Column(Integer, nullable=False, server_default="0")
+
+    __table_args__ = (
+        UniqueConstraint("category", "query", name="uq_crawl_targets_category_query"),
+    )
@@ -1,13 +1,16 @@
-from typing import List 
+from typing import Callable, List 
 import httpx 
 from bs4 import BeautifulSoup
 import re
 from urllib.parse import quote_plus
 
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
 
 BASE_SITE_URL = "https://lalafo.kg"
-BASE_CATEGORY_URL = f"{BASE_SITE_URL}/kyrgyzstan/mobilnye-telefony-i-aksessuary/mobilnye-telefony"
+DEFAULT_CATEGORY = "mobilnye-telefony-i-aksessuary/mobilnye-telefony"
+BASE_CATEGORY_URL = f"{BASE_SITE_URL}/kyrgyzstan/{DEFAULT_CATEGORY}"
+CARD_SELECTOR = "article[class*='LFAdTileHorizontal']"
+SCROLL_WAIT_MS = 1500
 
 class LalafoAd:
     def __init__(self, title: str, price: float | None, url: str, city: str | None = None, description: str | None = None):
@@ -46,15 +49,38 @@ def parse_price(text: str | None) -> float | None:
     except ValueError:
         return None
 
-def scrape_lalafo(query: str, max_items: int = 100) -> List[LalafoAd]:
+def category_url(category: str) -> str:
+    return f"{BASE_SITE_URL}/kyrgyzstan/{category.strip('/')}"
+
+
+def scrape_lalafo(
+    query: str,
+    max_items: int = 100,
+    category: str = DEFAULT_CATEGORY,
+    on_progress: Callable[[int], None] | None = None,
+    newest_first: bool = False,
+    is_known: Callable[[list[str]], set[str]] | None = None,
+    stop_after_known: int = 10,
+) -> List[LalafoAd]:
+    """
+    is_known получает пачку url и возвращает те, что уже есть в базе.
+    Известные объявления всё равно возвращаются (цена или заголовок могли
+    поменяться), но после stop_after_known известных подряд обход прекращается:
+    при сортировке по новизне дальше идут только старые.
+    """
     ads: List[LalafoAd] = []
     seen_urls: set[str] = set()
+    base_url = category_url(category)
 
+    params = []
     if query.strip():
-        q_param = quote_plus(query.strip())
-        url = f"{BASE_CATEGORY_URL}?q={q_param}"
-    else:
-        url = BASE_CATEGORY_URL
+        params.append(f"q={quote_plus(query.strip())}")
+    if newest_first:
+        params.append("sort_by=newest")
+    url = f"{base_url}?{'&'.join(params)}" if params else base_url
+
+    known_streak = 0
+    reached_known = False
 
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
@@ -71,8 +97,9 @@ def scrape_lalafo(query: str, max_items: int = 100) -> List[LalafoAd]:
         prev_cards_count = 0
         stagnant_rounds = 0
 
-        while len(ads) < max_items and stagnant_rounds < 5:
-            card_elements = page.query_selector_all("article[class*='LFAdTileHorizontal']")
+        while len(ads) < max_items and stagnant_rounds < 5 and not reached_known:
+            card_elements = page.query_selector_all(CARD_SELECTOR)
+            round_ads: List[LalafoAd] = []
             current_count = len(card_elements)
 
             if current_count == prev_cards_count:
@@ -120,7 +147,7 @@ def scrape_lalafo(query: str, max_items: int = 100) -> List[LalafoAd]:
                     if span:
                         city = span.inner_text().strip()
 
-                ads.append(
+                round_ads.append(
                     LalafoAd(
                         title=title,
                         price=price,
@@ -130,14 +157,36 @@ def scrape_lalafo(query: str, max_items: int = 100) -> List[LalafoAd]:
                     )
                 )
 
+            known = is_known([ad.url for ad in round_ads]) if is_known and round_ads else set()
+            for ad in round_ads:
+                ads.append(ad)
                 if len(ads) >= max_items:
                     break
 
-            if len(ads) >= max_items:
+                if ad.url in known:
+                    known_streak += 1
+                    if known_streak >= stop_after_known:
+                        reached_known = True
+                        break
+                else:
+                    known_streak = 0
+
+            if on_progress:
+                on_progress(len(ads))
+
+            if len(ads) >= max_items or reached_known:
                 break
 
             page.evaluate("window.scrollBy(0, document.body.scrollHeight)")
-            page.wait_for_timeout(1500)
+            try:
+                # ждём подгрузки новых карточек, а не фиксированную паузу
+                page.wait_for_function(
+                    "([sel, n]) => document.querySelectorAll(sel).length > n",
+                    arg=[CARD_SELECTOR, current_count],
+                    timeout=SCROLL_WAIT_MS,
+                )
+            except PlaywrightTimeoutError:
+                pass
 
         browser.close()
 
@@ -0,0 +1,112 @@
+import argparse
+import logging
+import time
+from datetime import timedelta
+from itertools import product
+from .db import SessionLocal, init_db
+from .crawl_planner import due_targets, plan_crawl
+from .jobs import claim_next_job, enqueue_refresh, expire_stale_jobs, run_job
+from .scraper_lalafo import DEFAULT_CATEGORY
+
+logger = logging.getLogger("scrape_worker")
+
+POLL_INTERVAL = 5.0
+
+
+def parse_target(value: str) -> tuple[str, str]:
+    # "категория" или "категория:запрос"
+    category, _, query = value.partition(":")
+    return category.strip() or DEFAULT_CATEGORY, query.strip()
+
+
+def enqueue_targets(pairs: list[tuple[str, str]], limit: int, every: float | None) -> list[tuple[str, str]]:
+    """
+    Без every ставит в очередь каждую цель один раз. С every берёт из crawl_targets
+    те, что не обходились дольше every секунд, в порядке планировщика.
+    Возвращает цели, которые не удалось поставить: по их категории уже идёт задача.
+    """
+    db = SessionLocal()
+    try:
+        if every:
+            targets = due_targets(db, pairs, timedelta(seconds=every))
+        else:
+            targets = plan_crawl(db, pairs)
+        skipped = []
+        for target in targets:
+            job, created = enqueue_refresh(db, target.category, target.query, limit)
+            if created:
+                logger.info("queued job %s for %s %r", job.id, target.category, target.query)
+            else:
+                skipped.append((target.category, target.query))
+        return skipped
+    finally:
+        db.close()
+
+
+def work(pairs: list[tuple[str, str]], limit: int, every: float | None, once: bool = False):
+    # разовый прогон: цели одной категории ставятся по очереди, по одной за раз
+    pending = [] if every else pairs
+
+    while True:
+        job = None
+        try:
+            if pairs and every:
+                enqueue_targets(pairs, limit, every)
+            elif pending:
+                pending = enqueue_targets(pending, limit, None)
+
+            db = SessionLocal()
+            try:
+                job = claim_next_job(db)
+                if job:
+                    logger.info("running job %s for %s %r", job.id, job.category, job.query)
+                    run_job(db, job)
+                    logger.info("job %s finished with status %s", job.id, job.status)
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+        except Exception:
+            # кратковременный сбой базы не должен останавливать воркер; задачу,
+            # оставшуюся в running, потом снимет expire_stale_jobs
+            logger.exception("worker iteration failed")
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        if once and not job and not pending:
+            return
+        if not job:
+            time.sleep(POLL_INTERVAL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воркер очереди обновления объявлений lalafo")
+    parser.add_argument(
+        "--target",
+        action="append",
+        default=[],
+        help="категория[:запрос] для обновления, можно указать несколько раз",
+    )
+    parser.add_argument("--category", action="append", default=[], help="категория для планировщика обхода")
+    parser.add_argument("--query", action="append", default=[], help="запрос для каждой из --category")
+    parser.add_argument("--every", type=float, default=None, help="период обхода целей в секундах; без него каждая цель ставится в очередь один раз")
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--once", action="store_true", help="разобрать очередь и выйти")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    init_db()
+    db = SessionLocal()
+    try:
+        expired = expire_stale_jobs(db)
+    finally:
+        db.close()
+    if expired:
+        logger.info("marked %s stale running jobs as failed", expired)
+    pairs = list(product(args.category, args.query or [""])) + [parse_target(t) for t in args.target]
+    work(pairs, args.limit, args.every, once=args.once)
+
+
+if __name__ == "__main__":
+    main()
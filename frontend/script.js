@@ -183,6 +183,38 @@ async function handleSearch() {
   }
 }
 
+const REFRESH_POLL_MS = 2000
+// ~10 минут; дальше перестаём ждать, задача продолжит выполняться на сервере
+const REFRESH_MAX_POLLS = 300
+
+async function waitForRefreshJob(jobId) {
+  for (let i = 0; i < REFRESH_MAX_POLLS; i++) {
+    const res = await fetch(apiBase + "/ads/refresh_lalafo/" + jobId)
+    if (!res.ok) {
+      setStatus("Не удалось получить статус обновления: " + res.status, "error")
+      return null
+    }
+
+    const job = await res.json()
+    if (job.status === "done") return job.result || {}
+    if (job.status === "failed") {
+      setStatus("Обновление базы завершилось ошибкой", "error")
+      return null
+    }
+
+    if (job.status === "queued") {
+      setStatus("Обновление в очереди, ждём воркер...", "loading")
+    } else {
+      const percent = Math.round((job.progress || 0) * 100)
+      setStatus("Добавляем карточки из Lalafo... " + percent + "%", "loading")
+    }
+    await new Promise(resolve => setTimeout(resolve, REFRESH_POLL_MS))
+  }
+
+  setStatus("Обновление идёт слишком долго — проверьте, запущен ли воркер (python -m app.worker)", "error")
+  return null
+}
+
 async function handleRefresh() {
   refreshBtn.disabled = true
   setStatus("Добавляем карточки из Lalafo...", "loading")
@@ -198,9 +230,12 @@ async function handleRefresh() {
       return
     }
 
-    const data = await res.json()
-    const created = data.created ?? 0
-    const updated = data.updated_embeddings ?? 0
+    const job = await res.json()
+    const data = await waitForRefreshJob(job.job_id)
+    if (!data) return
+
+    const created = data.inserted ?? 0
+    const updated = data.updated ?? 0
 
     setStatus(
       "Добавили " + created + " новых объявлений",